@@ -1,8 +1,98 @@
-from django.contrib import admin
-from .models import CustomUser, UserMessageContents, OTPCode, AuthProvider
-
-# Register your models here.
-admin.site.register(CustomUser)
-admin.site.register(UserMessageContents)
-admin.site.register(OTPCode)
-admin.site.register(AuthProvider)
+from django.contrib import admin, messages
+from django.template.response import TemplateResponse
+from django.urls import path
+from django.utils import timezone
+
+from .archive import archive_queryset
+from .dashboard import daily_activity
+from .models import CustomUser, UserMessageContents, ArchivedUserMessage, OTPCode, AuthProvider
+
+
+# Every changelist below runs a fixed number of queries: related users are
+# joined in with list_select_related, user pickers are raw-id inputs, and
+# the unfiltered COUNT(*) is skipped.
+
+@admin.register(CustomUser)
+class CustomUserAdmin(admin.ModelAdmin):
+    list_display = ('email', 'name', 'phone', 'is_verified', 'verified_at', 'is_active', 'is_staff', 'created')
+    list_filter = ('is_verified', 'is_active', 'is_staff')
+    search_fields = ('email', 'name', 'phone')
+    show_full_result_count = False
+    actions = ['mark_verified', 'deactivate']
+
+    @admin.action(description="Mark selected users as verified and active")
+    def mark_verified(self, request, queryset):
+        queryset.filter(is_verified=False).update(verified_at=timezone.now())
+        updated = queryset.update(is_verified=True, is_active=True)
+        self.message_user(request, f"{updated} users marked as verified.", messages.SUCCESS)
+
+    @admin.action(description="Deactivate selected users")
+    def deactivate(self, request, queryset):
+        updated = queryset.update(is_active=False)
+        self.message_user(request, f"{updated} users deactivated.", messages.SUCCESS)
+
+
+@admin.register(AuthProvider)
+class AuthProviderAdmin(admin.ModelAdmin):
+    list_display = ('user', 'provider', 'created')
+    list_filter = ('provider',)
+    list_select_related = ('user',)
+    search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+    show_full_result_count = False
+
+
+@admin.register(UserMessageContents)
+class UserMessageContentsAdmin(admin.ModelAdmin):
+    list_display = ('purpose', 'user', 'timestamp')
+    list_select_related = ('user',)
+    search_fields = ('purpose', 'user__email')
+    raw_id_fields = ('user',)
+    show_full_result_count = False
+    actions = ['archive_selected']
+
+    @admin.action(description="Move selected messages to the archive")
+    def archive_selected(self, request, queryset):
+        result = archive_queryset(queryset)
+        self.message_user(request, f"{result.rows} messages archived.", messages.SUCCESS)
+
+    def get_urls(self):
+        return [
+            path('dashboard/', self.admin_site.admin_view(self.dashboard_view), name='portfolio_v2_dashboard'),
+            *super().get_urls(),
+        ]
+
+    def dashboard_view(self, request):
+        try:
+            days = max(1, min(int(request.GET.get('days', 30)), 365))
+        except ValueError:
+            days = 30
+
+        context = {
+            **self.admin_site.each_context(request),
+            "title": f"Activity in the last {days} days",
+            "opts": self.model._meta,
+            "days": days,
+            "rows": daily_activity(days),
+        }
+        return TemplateResponse(request, "admin/portfolio_v2/dashboard.html", context)
+
+
+@admin.register(ArchivedUserMessage)
+class ArchivedUserMessageAdmin(admin.ModelAdmin):
+    list_display = ('purpose', 'user', 'timestamp', 'archived_at')
+    list_select_related = ('user',)
+    search_fields = ('purpose', 'user__email')
+    raw_id_fields = ('user',)
+    readonly_fields = ('message',)
+    exclude = ('compressed_message',)
+    show_full_result_count = False
+
+
+@admin.register(OTPCode)
+class OTPCodeAdmin(admin.ModelAdmin):
+    list_display = ('user', 'otp_code', 'created_at')
+    list_select_related = ('user',)
+    search_fields = ('user__email',)
+    raw_id_fields = ('user',)
+    show_full_result_count = False
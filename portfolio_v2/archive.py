@@ -0,0 +1,103 @@
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from heapq import merge
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import UserMessageContents, ArchivedUserMessage
+from .routers import use_primary
+
+
+@dataclass
+class ArchiveResult:
+    rows: int
+    seconds: float
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else float(self.rows)
+
+
+def archive_messages(older_than=None, batch_size=None):
+    """
+    Move messages older than `older_than` (a timedelta, defaulting to
+    MESSAGE_ARCHIVE_AFTER_DAYS) into ArchivedUserMessage.
+    """
+    if older_than is None:
+        older_than = timedelta(days=settings.MESSAGE_ARCHIVE_AFTER_DAYS)
+    cutoff = timezone.now() - older_than
+    return archive_queryset(UserMessageContents.objects.filter(timestamp__lt=cutoff), batch_size)
+
+
+def archive_queryset(queryset, batch_size=None):
+    """
+    Move the UserMessageContents rows in `queryset` into ArchivedUserMessage,
+    one batch per transaction so the hot table is never locked for the
+    whole run.
+    """
+    batch_size = batch_size or settings.MESSAGE_ARCHIVE_BATCH_SIZE
+    archived = 0
+    started = time.monotonic()
+
+    with use_primary():
+        while True:
+            with transaction.atomic():
+                batch = list(
+                    queryset
+                    .order_by('pk')
+                    .values('pk', 'user_id', 'purpose', 'message', 'timestamp')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                # Copy and delete share this transaction. A clash on original_id
+                # raises and rolls the batch back, leaving the hot rows in place.
+                ArchivedUserMessage.objects.bulk_create([
+                    ArchivedUserMessage(
+                        original_id=row['pk'],
+                        user_id=row['user_id'],
+                        purpose=row['purpose'],
+                        compressed_message=ArchivedUserMessage.compress(row['message']),
+                        timestamp=row['timestamp'],
+                    )
+                    for row in batch
+                ])
+
+                UserMessageContents.objects.filter(pk__in=[row['pk'] for row in batch]).delete()
+                archived += len(batch)
+
+    return ArchiveResult(rows=archived, seconds=time.monotonic() - started)
+
+
+def message_history(**filters):
+    """
+    Return messages from the hot and archive tables as one list ordered by
+    timestamp. `filters` are applied to both querysets, so only fields the
+    two models share (user, purpose, timestamp) can be used.
+    """
+    hot = (
+        {
+            "id": m.pk,
+            "user_id": m.user_id,
+            "purpose": m.purpose,
+            "message": m.message,
+            "timestamp": m.timestamp,
+            "archived": False,
+        }
+        for m in UserMessageContents.objects.filter(**filters).order_by('timestamp')
+    )
+    cold = (
+        {
+            "id": m.original_id,
+            "user_id": m.user_id,
+            "purpose": m.purpose,
+            "message": m.message,
+            "timestamp": m.timestamp,
+            "archived": True,
+        }
+        for m in ArchivedUserMessage.objects.filter(**filters).order_by('timestamp')
+    )
+    return list(merge(cold, hot, key=lambda m: m["timestamp"]))
@@ -0,0 +1,148 @@
+import math
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+class CircuitOpenError(Exception):
+    """A dependency's breaker is open, so the call was refused without trying it."""
+
+    def __init__(self, name, retry_after):
+        self.name = name
+        self.retry_after = retry_after
+        super().__init__(f"{name} is temporarily unavailable")
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker for one external dependency, with its state in the cache
+    so every worker sees the same thing.
+
+    closed:    calls go through; consecutive failures within the failure
+               window are counted.
+    open:      after `failure_threshold` failures, calls fail fast with
+               CircuitOpenError for `reset_timeout` seconds.
+    half_open: after that, one probe call is let through. Success closes the
+               breaker, failure opens it again.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name, failure_threshold=None, reset_timeout=None):
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+
+    @property
+    def failure_threshold(self):
+        return self._failure_threshold or settings.CIRCUIT_BREAKER_FAILURE_THRESHOLD
+
+    @property
+    def reset_timeout(self):
+        return self._reset_timeout or settings.CIRCUIT_BREAKER_RESET_TIMEOUT
+
+    @property
+    def cache(self):
+        return caches[settings.CIRCUIT_BREAKER_CACHE_ALIAS]
+
+    def _key(self, suffix):
+        return f"breaker:{self.name}:{suffix}"
+
+    def _opened_at(self):
+        return self.cache.get(self._key("opened_at"))
+
+    def state(self):
+        opened_at = self._opened_at()
+        if opened_at is None:
+            return self.CLOSED
+        if time.time() - opened_at < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """Raise CircuitOpenError unless a call may be made right now."""
+        opened_at = self._opened_at()
+        if opened_at is None:
+            return
+
+        retry_after = opened_at + self.reset_timeout - time.time()
+        if retry_after > 0:
+            raise CircuitOpenError(self.name, math.ceil(retry_after))
+
+        # Half-open: only the worker that claims the probe slot may try.
+        if not self.cache.add(self._key("probe"), True, timeout=self.reset_timeout):
+            raise CircuitOpenError(self.name, self.reset_timeout)
+
+    def record_success(self):
+        self.cache.delete_many([self._key("failures"), self._key("opened_at"), self._key("probe")])
+
+    def record_failure(self):
+        cache = self.cache
+        if self._opened_at() is not None:
+            # A failed half-open probe: open again for another reset_timeout.
+            self._open()
+            return
+
+        key = self._key("failures")
+        cache.add(key, 0, timeout=settings.CIRCUIT_BREAKER_FAILURE_WINDOW)
+        try:
+            failures = cache.incr(key)
+        except ValueError:
+            # The counter expired between add() and incr().
+            cache.set(key, 1, timeout=settings.CIRCUIT_BREAKER_FAILURE_WINDOW)
+            failures = 1
+
+        if failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self):
+        self.cache.set(self._key("opened_at"), time.time(), timeout=None)
+        self.cache.delete_many([self._key("failures"), self._key("probe")])
+
+    def call(self, func, *args, is_failure=None, **kwargs):
+        """
+        Run `func` through the breaker. An exception counts as a failure
+        when `is_failure(exc)` is true (every exception if not given);
+        other exceptions mean the dependency answered, so they count as a
+        success before being re-raised.
+        """
+        self.allow()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if is_failure is None or is_failure(e):
+                self.record_failure()
+            else:
+                self.record_success()
+            raise
+        self.record_success()
+        return result
+
+    def snapshot(self):
+        return {
+            "state": self.state(),
+            "failures": self.cache.get(self._key("failures"), 0),
+            "opened_at": self._opened_at(),
+        }
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_breaker(name):
+    """Return the process-wide breaker for `name`, creating it on first use."""
+    with _breakers_lock:
+        if name not in _breakers:
+            _breakers[name] = CircuitBreaker(name)
+        return _breakers[name]
+
+
+def breaker_snapshots():
+    with _breakers_lock:
+        breakers = sorted(_breakers.values(), key=lambda b: b.name)
+    return {breaker.name: breaker.snapshot() for breaker in breakers}
@@ -0,0 +1,63 @@
+from collections import defaultdict
+from datetime import timedelta
+
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import ArchivedUserMessage, AuthProvider, CustomUser, UserMessageContents
+
+
+def daily_activity(days=30):
+    """
+    Per-day, per-provider counts of signups, verifications and messages
+    for the last `days` days, newest day first.
+
+    Each count is one GROUP BY query, so the cost does not grow with the
+    number of rows shown. A signup is an AuthProvider row. A verification
+    is counted on the day of CustomUser.verified_at, and a message, hot or
+    archived, on the day it was sent; both once for every provider the
+    user has linked.
+    """
+    since = timezone.now() - timedelta(days=days)
+    rows = defaultdict(lambda: {"signups": 0, "verifications": 0, "messages": 0})
+
+    signups = (
+        AuthProvider.objects
+        .filter(created__gte=since)
+        .annotate(day=TruncDate('created'))
+        .values('day', 'provider')
+        .annotate(signups=Count('id'))
+        .order_by()
+    )
+    for row in signups:
+        rows[(row['day'], row['provider'])]["signups"] = row["signups"]
+
+    verifications = (
+        CustomUser.objects
+        .filter(verified_at__gte=since, auth_providers__isnull=False)
+        .annotate(day=TruncDate('verified_at'))
+        .values('day', 'auth_providers__provider')
+        .annotate(verifications=Count('id'))
+        .order_by()
+    )
+    for row in verifications:
+        rows[(row['day'], row['auth_providers__provider'])]["verifications"] = row["verifications"]
+
+    # Messages older than MESSAGE_ARCHIVE_AFTER_DAYS live in the archive table.
+    for model in (UserMessageContents, ArchivedUserMessage):
+        messages = (
+            model.objects
+            .filter(timestamp__gte=since, user__auth_providers__isnull=False)
+            .annotate(day=TruncDate('timestamp'))
+            .values('day', 'user__auth_providers__provider')
+            .annotate(messages=Count('id'))
+            .order_by()
+        )
+        for row in messages:
+            rows[(row['day'], row['user__auth_providers__provider'])]["messages"] += row["messages"]
+
+    return [
+        {"day": day, "provider": provider, **counts}
+        for (day, provider), counts in sorted(rows.items(), key=lambda item: (item[0][0], item[0][1]), reverse=True)
+    ]
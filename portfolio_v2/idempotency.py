@@ -0,0 +1,90 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+
+from rest_framework.response import Response
+from rest_framework import status
+
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+
+
+def _get_cache():
+    return caches[settings.IDEMPOTENCY_CACHE_ALIAS]
+
+
+def _digest(value):
+    return hashlib.sha256(value.encode()).hexdigest()
+
+
+def _cache_key(request, key):
+    user = request.user.pk if request.user and request.user.is_authenticated else 'anon'
+    return f"idempotency:{_digest(f'{request.path}:{user}:{key}')}"
+
+
+def _fingerprint(request):
+    return _digest(json.dumps(request.data, sort_keys=True, default=str))
+
+
+def idempotent(view_method):
+    """
+    Replay the stored response for a repeated `Idempotency-Key` header.
+
+    The first request with a key runs normally and, unless it failed with a
+    5xx, its response is kept for IDEMPOTENCY_KEY_TTL seconds. Retries with
+    the same key and body get that response back without touching the
+    database or sending email. Requests without the header are unaffected.
+    """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response({"error": "Idempotency-Key is too long"}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache = _get_cache()
+        cache_key = _cache_key(request, key)
+        fingerprint = _fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is None:
+            # Only one request per key may run; concurrent retries are told to wait.
+            lock_key = f"{cache_key}:lock"
+            if not cache.add(lock_key, True, timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT):
+                return Response(
+                    {"error": "A request with this Idempotency-Key is already in progress"},
+                    status=status.HTTP_409_CONFLICT,
+                )
+            try:
+                # The first request may have stored its response and released
+                # the lock between our get() and add(); replay it if so.
+                stored = cache.get(cache_key)
+                if stored is None:
+                    response = view_method(self, request, *args, **kwargs)
+                    if response.status_code < 500:
+                        cache.set(cache_key, {
+                            "fingerprint": fingerprint,
+                            "status": response.status_code,
+                            "data": response.data,
+                        }, timeout=settings.IDEMPOTENCY_KEY_TTL)
+                    return response
+            finally:
+                cache.delete(lock_key)
+
+        if stored["fingerprint"] != fingerprint:
+            return Response(
+                {"error": "Idempotency-Key was already used with a different request body"},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+
+        response = Response(stored["data"], status=stored["status"])
+        response[REPLAYED_HEADER] = 'true'
+        return response
+
+    return wrapper
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from portfolio_v2.archive import archive_messages
+
+
+class Command(BaseCommand):
+    help = "Move old user messages from the hot table into the compressed archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=settings.MESSAGE_ARCHIVE_AFTER_DAYS,
+            help="Archive messages older than this many days.",
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=settings.MESSAGE_ARCHIVE_BATCH_SIZE,
+            help="Number of messages moved per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        result = archive_messages(
+            older_than=timedelta(days=options['days']),
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Archived {result.rows} messages in {result.seconds:.2f}s "
+            f"({result.rows_per_second:.0f} rows/sec)"
+        ))
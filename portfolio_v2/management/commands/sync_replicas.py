@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from portfolio_v2.routers import get_replicas
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy the primary SQLite database, schema and rows, into each SQLite "
+        "replica. For local development only; real replicas are kept in sync "
+        "by the database server."
+    )
+
+    def handle(self, *args, **options):
+        replicas = get_replicas()
+        if not replicas:
+            self.stdout.write("No replicas configured (set DATABASE_REPLICAS).")
+            return
+
+        primary = connections[DEFAULT_DB_ALIAS]
+        for alias in (DEFAULT_DB_ALIAS, *replicas):
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"Database '{alias}' is not SQLite; use the database's own replication.")
+
+        primary.ensure_connection()
+        for alias in replicas:
+            replica = connections[alias]
+            replica.ensure_connection()
+            # SQLite's online backup copies the whole file, so the replica gets
+            # the schema that `migrate` never creates there (see allow_migrate).
+            primary.connection.backup(replica.connection)
+            self.stdout.write(self.style.SUCCESS(
+                f"Copied {primary.settings_dict['NAME']} into {replica.settings_dict['NAME']}"
+            ))
@@ -0,0 +1,78 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .routers import get_replicas, request_writes, reset_routing_state, stick_to_primary
+
+
+def _token_user_id(request):
+    """The user id in the request's JWT, checked without a database read."""
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = header and auth.get_raw_token(header)
+    if not raw_token:
+        return None
+    try:
+        return auth.get_validated_token(raw_token).get(api_settings.USER_ID_CLAIM)
+    except InvalidToken:
+        return None
+
+
+def _sticky_key(kind, value):
+    return f"replica-sticky:{kind}:{value}"
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Start every request with fresh read-your-writes routing state, and keep
+    a client's reads on the primary for REPLICA_STICKY_SECONDS after it
+    wrote, so its next request does not read from a lagging replica.
+
+    A client is recognised by its session cookie and by the user in its
+    JWT, both without touching the database. The marks live in the cache,
+    which must be shared when running several workers.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        reset_routing_state()
+        try:
+            if not get_replicas():
+                return self.get_response(request)
+
+            user_id = _token_user_id(request)
+            session_key = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+            incoming = [_sticky_key("user", user_id)] if user_id else []
+            if session_key:
+                incoming.append(_sticky_key("session", session_key))
+            if incoming and cache.get_many(incoming):
+                stick_to_primary()
+
+            response = self.get_response(request)
+
+            wrote, writers = request_writes()
+            if wrote:
+                self._remember_write(request, incoming, writers)
+            return response
+        finally:
+            reset_routing_state()
+
+    def _remember_write(self, request, incoming, writers):
+        keys = set(incoming)
+        keys.update(_sticky_key("user", pk) for pk in writers)
+
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            keys.add(_sticky_key("user", user.pk))
+
+        # Logging in cycles the session key, so use the one just saved.
+        session = getattr(request, "session", None)
+        if session is not None and session.session_key:
+            keys.add(_sticky_key("session", session.session_key))
+
+        cache.set_many(dict.fromkeys(keys, True), timeout=settings.REPLICA_STICKY_SECONDS)
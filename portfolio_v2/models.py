@@ -1,3 +1,5 @@
+import zlib
+
 from django.utils import timezone
 from datetime import timedelta
 
@@ -12,6 +14,8 @@ class CustomUserManager(BaseUserManager):
             raise ValueError('A valid email address is required')
 
         email = self.normalize_email(email)
+        if extra_fields.get('is_verified'):
+            extra_fields.setdefault('verified_at', timezone.now())
 
         user = self.model(
             name=name,
@@ -52,6 +56,7 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
 
     # Status flags
     is_verified = models.BooleanField(default=False)
+    verified_at = models.DateTimeField(null=True, blank=True, db_index=True)
     is_staff = models.BooleanField(default=False)
     is_active = models.BooleanField(default=False)
 
@@ -98,11 +103,40 @@ class UserMessageContents(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='messages', blank=True, null=True)
     purpose = models.CharField(max_length=255, null=True, blank=True)
     message = models.TextField(null=True, blank=True)
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        ordering = ['timestamp']
+
+    def __str__(self):
+        return self.purpose or "No purpose"
+
+
+
+# Old UserMessageContents rows moved out of the hot table (see archive.py)
+class ArchivedUserMessage(models.Model):
+    original_id = models.BigIntegerField(unique=True)
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='archived_messages', blank=True, null=True)
+    purpose = models.CharField(max_length=255, null=True, blank=True)
+    compressed_message = models.BinaryField(null=True, blank=True)
+    timestamp = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ['timestamp']
 
+    @staticmethod
+    def compress(message):
+        if message is None:
+            return None
+        return zlib.compress(message.encode('utf-8'))
+
+    @property
+    def message(self):
+        if self.compressed_message is None:
+            return None
+        return zlib.decompress(bytes(self.compressed_message)).decode('utf-8')
+
     def __str__(self):
         return self.purpose or "No purpose"
 
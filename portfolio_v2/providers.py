@@ -0,0 +1,359 @@
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass
+from functools import partial
+
+import requests
+from django.conf import settings
+
+from google.auth import jwt as google_jwt
+from google.auth.exceptions import GoogleAuthError
+
+from .breakers import CircuitOpenError, get_breaker
+
+
+class ProviderVerificationError(Exception):
+    """The provider rejected the token or did not return an identity."""
+
+
+class ProviderUnavailableError(Exception):
+    """The provider could not be reached or did not answer in time."""
+
+
+class LookupNotStartedError(Exception):
+    """A lookup was still queued for a pool worker when the deadline passed."""
+
+
+# Failures that mean the provider is unhealthy, as opposed to a bad token.
+TRANSPORT_ERRORS = (requests.RequestException, TimeoutError)
+
+
+@dataclass
+class ProviderIdentity:
+    email: str | None
+    name: str | None = None
+
+
+def _get_json(url, **kwargs):
+    kwargs.setdefault("timeout", settings.SOCIAL_AUTH_TIMEOUT)
+    resp = requests.get(url, **kwargs)
+    # A 5xx or 429 means the provider is failing, whatever its body says.
+    # Other 4xx bodies describe a rejected token and are left to merge().
+    if resp.status_code >= 500 or resp.status_code == 429:
+        resp.raise_for_status()
+    return resp.json()
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.SOCIAL_AUTH_MAX_WORKERS,
+                thread_name_prefix="provider-lookup",
+            )
+        return _executor
+
+
+def fan_out(calls, deadline):
+    """
+    Run independent zero-argument callables concurrently and wait at most
+    `deadline` seconds for all of them, counted from submission.
+
+    Returns a dict with the same keys as `calls`. Each value is the call's
+    return value, or the exception it raised: TimeoutError if it was still
+    running at the deadline, LookupNotStartedError if it never left the queue.
+    """
+    if len(calls) == 1:
+        # Nothing to overlap, so skip the thread hand-off.
+        name, call = next(iter(calls.items()))
+        try:
+            return {name: call()}
+        except Exception as e:
+            return {name: e}
+
+    executor = _get_executor()
+    futures = {name: executor.submit(call) for name, call in calls.items()}
+    wait(futures.values(), timeout=deadline)
+
+    results = {}
+    for name, future in futures.items():
+        # cancel() only succeeds for calls no worker has picked up yet.
+        if future.cancel():
+            results[name] = LookupNotStartedError(f"Lookup '{name}' did not start within {deadline}s")
+        elif not future.done():
+            results[name] = TimeoutError(f"Lookup '{name}' did not finish within {deadline}s")
+        else:
+            results[name] = future.exception() or future.result()
+    return results
+
+
+class ProviderVerifier:
+    """Turns a token sent by the client into the user's identity at the provider."""
+
+    provider = None
+    label = None
+
+    def verify(self, token):
+        raise NotImplementedError
+
+
+
+# ---- Access-token verifiers (provider API lookups on every login) ----
+
+class LookupVerifier(ProviderVerifier):
+    """
+    Verifier declared as a set of independent provider API lookups.
+
+    `lookups()` maps a name to the (url, headers) of a GET request. All of
+    them run concurrently under one SOCIAL_AUTH_DEADLINE, so a login costs
+    about as long as the slowest lookup. `merge()` turns the results into a
+    ProviderIdentity, reading the lookups it needs through `required()`.
+    """
+
+    def lookups(self, token):
+        raise NotImplementedError
+
+    def merge(self, results):
+        raise NotImplementedError
+
+    def __init__(self):
+        self.breaker = get_breaker(f"provider:{self.provider}")
+
+    def verify(self, token):
+        self.breaker.allow()
+        calls = {
+            name: partial(_get_json, url, headers=headers)
+            for name, (url, headers) in self.lookups(token).items()
+        }
+        results = fan_out(calls, settings.SOCIAL_AUTH_DEADLINE)
+
+        # required() re-raises a failed lookup, so a transport error only gets
+        # here when merge() needed that lookup. Optional lookups that failed
+        # (e.g. GitHub emails when /user already had one) do not count.
+        try:
+            identity = self.merge(results)
+        except TRANSPORT_ERRORS as e:
+            self.breaker.record_failure()
+            raise ProviderUnavailableError(f"{self.label} is not responding") from e
+        except LookupNotStartedError as e:
+            # Our own pool was busy, which says nothing about the provider.
+            raise ProviderUnavailableError(f"{self.label} login is busy, try again") from e
+        except Exception:
+            # The provider answered, e.g. by rejecting the token.
+            self.breaker.record_success()
+            raise
+
+        self.breaker.record_success()
+        return identity
+
+    @staticmethod
+    def required(results, name):
+        """Return a lookup result, re-raising the error if the lookup failed."""
+        value = results[name]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+
+class GoogleUserInfoVerifier(LookupVerifier):
+    provider = "google"
+    label = "Google"
+
+    def lookups(self, token):
+        return {
+            "userinfo": ("https://www.googleapis.com/oauth2/v3/userinfo", {"Authorization": f"Bearer {token}"}),
+        }
+
+    def merge(self, results):
+        data = self.required(results, "userinfo")
+        if "error" in data or "email" not in data:
+            raise ProviderVerificationError(f"Invalid {self.label} token")
+        return ProviderIdentity(email=data.get("email"), name=data.get("name"))
+
+
+class FacebookVerifier(LookupVerifier):
+    provider = "facebook"
+    label = "Facebook"
+
+    def lookups(self, token):
+        return {
+            "me": (f"https://graph.facebook.com/me?fields=id,name,email&access_token={token}", {}),
+        }
+
+    def merge(self, results):
+        data = self.required(results, "me")
+        if "error" in data:
+            raise ProviderVerificationError(f"Invalid {self.label} token")
+        return ProviderIdentity(email=data.get("email"), name=data.get("name"))
+
+
+class GitHubVerifier(LookupVerifier):
+    provider = "github"
+    label = "GitHub"
+
+    def lookups(self, token):
+        # /user/emails is fetched up front instead of only when /user hides
+        # the email, trading one extra request for one less round-trip.
+        return {
+            "user": ("https://api.github.com/user", {"Authorization": f"Bearer {token}"}),
+            "emails": ("https://api.github.com/user/emails", {"Authorization": f"token {token}"}),
+        }
+
+    def merge(self, results):
+        data = self.required(results, "user")
+        if "id" not in data:
+            raise ProviderVerificationError(f"Invalid {self.label} token")
+
+        email = data.get("email")  # sometimes null if user hides email
+        if not email:  # fallback if email is hidden
+            emails_data = self.required(results, "emails")
+            if isinstance(emails_data, list):
+                for e in emails_data:
+                    if e.get("primary") and e.get("verified"):
+                        email = e["email"]
+                        break
+
+        return ProviderIdentity(email=email, name=data.get("name"))
+
+
+
+# ---- ID-token verifiers (signature checked locally, no call per login) ----
+
+class CachedCerts:
+    """
+    In-memory copy of a provider's public signing certificates.
+
+    Certificates are refetched when the Cache-Control max-age runs out, or
+    early when a token names a key id we have not seen (key rotation). The
+    early refetch is rate limited so forged key ids cannot hammer the
+    provider.
+    """
+
+    def __init__(self, url, breaker, default_ttl=3600, min_refresh_interval=60):
+        self.url = url
+        self.breaker = breaker
+        self.default_ttl = default_ttl
+        self.min_refresh_interval = min_refresh_interval
+        self._certs = {}
+        self._expires_at = 0
+        self._fetched_at = None
+        self._lock = threading.Lock()
+
+    def _request(self):
+        resp = requests.get(self.url, timeout=settings.SOCIAL_AUTH_TIMEOUT)
+        resp.raise_for_status()
+        return resp
+
+    def _fetch(self):
+        try:
+            resp = self.breaker.call(self._request)
+        except TRANSPORT_ERRORS as e:
+            raise ProviderUnavailableError(f"Could not fetch signing keys from {self.url}") from e
+        match = re.search(r"max-age=(\d+)", resp.headers.get("Cache-Control", ""))
+        ttl = int(match.group(1)) if match else self.default_ttl
+
+        now = time.monotonic()
+        self._certs = resp.json()
+        self._fetched_at = now
+        self._expires_at = now + ttl
+
+    def get(self, key_id=None):
+        with self._lock:
+            now = time.monotonic()
+            expired = now >= self._expires_at
+            rotated = (
+                not expired and key_id and key_id not in self._certs
+                and now - self._fetched_at >= self.min_refresh_interval
+            )
+            if expired or rotated:
+                try:
+                    self._fetch()
+                except (ProviderUnavailableError, CircuitOpenError):
+                    # Keep verifying with the keys we have while the provider is
+                    # down, and back off so logins don't each wait on a refetch.
+                    if not self._certs:
+                        raise
+                    self._expires_at = max(self._expires_at, now + self.min_refresh_interval)
+                    self._fetched_at = now
+            return self._certs
+
+
+class IDTokenVerifier(ProviderVerifier):
+    """Validates an OpenID Connect ID token against the provider's published certificates."""
+
+    certs_url = None
+    issuers = ()
+
+    def __init__(self, audience, certs=None):
+        self.audience = audience
+        self.certs = certs or CachedCerts(self.certs_url, get_breaker(f"provider:{self.provider}"))
+
+    def verify(self, token):
+        try:
+            header = google_jwt.decode_header(token)
+            payload = google_jwt.decode(
+                token,
+                certs=self.certs.get(header.get("kid")),
+                audience=self.audience,
+                clock_skew_in_seconds=10,
+            )
+        except (ValueError, GoogleAuthError) as e:
+            raise ProviderVerificationError(f"Invalid {self.label} token") from e
+
+        if payload.get("iss") not in self.issuers:
+            raise ProviderVerificationError(f"Invalid {self.label} token")
+        return self.identity(payload)
+
+    def identity(self, payload):
+        return ProviderIdentity(email=payload.get("email"), name=payload.get("name"))
+
+
+class GoogleIDTokenVerifier(IDTokenVerifier):
+    provider = "google"
+    label = "Google"
+    certs_url = "https://www.googleapis.com/oauth2/v1/certs"
+    issuers = ("accounts.google.com", "https://accounts.google.com")
+
+    def identity(self, payload):
+        if not payload.get("email_verified"):
+            raise ProviderVerificationError("Google email is not verified")
+        return super().identity(payload)
+
+
+
+ACCESS_TOKEN_VERIFIERS = {
+    "google": GoogleUserInfoVerifier(),
+    "facebook": FacebookVerifier(),
+    "github": GitHubVerifier(),
+}
+
+# Built on first use so the certificate cache lives for the whole process.
+_id_token_verifiers = {}
+_id_token_lock = threading.Lock()
+
+
+def _build_id_token_verifier(provider):
+    if provider == "google" and settings.GOOGLE_CLIENT_IDS:
+        return GoogleIDTokenVerifier(audience=settings.GOOGLE_CLIENT_IDS)
+    return None
+
+
+def get_verifier(provider, id_token=False):
+    """Return the verifier for `provider`, or None if that login mode is not supported."""
+    if not id_token:
+        return ACCESS_TOKEN_VERIFIERS.get(provider)
+
+    with _id_token_lock:
+        verifier = _id_token_verifiers.get(provider)
+        if verifier is None:
+            verifier = _build_id_token_verifier(provider)
+            if verifier is not None:
+                _id_token_verifiers[provider] = verifier
+        return verifier
@@ -0,0 +1,104 @@
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+# Per-request routing state. `_pinned` counts nested use_primary() blocks,
+# `_sticky` sends the rest of the request's reads to the primary, `_written`
+# is set once anything has been written and `_writers` holds the pks of users
+# the request wrote for without being authenticated as them.
+_pinned = ContextVar("replica_router_pinned", default=0)
+_sticky = ContextVar("replica_router_sticky", default=False)
+_written = ContextVar("replica_router_written", default=False)
+_writers = ContextVar("replica_router_writers", default=())
+
+
+def get_replicas():
+    """Return the configured replica aliases that have a database connection."""
+    return [alias for alias in getattr(settings, "DATABASE_REPLICAS", []) if alias in connections]
+
+
+@contextmanager
+def use_primary():
+    """Send every read inside the block to the primary database."""
+    token = _pinned.set(_pinned.get() + 1)
+    try:
+        yield
+    finally:
+        _pinned.reset(token)
+
+
+def mark_written():
+    """Make the rest of the request read from the primary (read-your-writes)."""
+    _sticky.set(True)
+    _written.set(True)
+
+
+def mark_writer(user):
+    """
+    Keep `user`'s next requests on the primary as well, for a user the
+    request created or verified without authenticating as them.
+    """
+    _writers.set((*_writers.get(), user.pk))
+
+
+def stick_to_primary():
+    """Send the rest of the request's reads to the primary without marking a write."""
+    _sticky.set(True)
+
+
+def request_writes():
+    """Return whether the request wrote, and the pks passed to mark_writer()."""
+    return _written.get(), _writers.get()
+
+
+def reset_routing_state():
+    _pinned.set(0)
+    _sticky.set(False)
+    _written.set(False)
+    _writers.set(())
+
+
+def reads_pinned_to_primary():
+    return bool(_pinned.get() or _sticky.get())
+
+
+class PrimaryReplicaRouter:
+    """
+    Send reads to a random replica and writes to the primary (`default`).
+
+    Reads fall back to the primary when no replica is configured, inside a
+    `use_primary()` block, after a write in the same request or by the same
+    client shortly before (see ReplicaRoutingMiddleware), or while the
+    primary has an open transaction (so reads see uncommitted rows).
+    """
+
+    def db_for_read(self, model, **hints):
+        replicas = get_replicas()
+        if not replicas or reads_pinned_to_primary():
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        mark_written()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in get_replicas()
+
+
+class PrimaryDatabaseMixin:
+    """APIView mixin that keeps the whole request on the primary database."""
+
+    def dispatch(self, request, *args, **kwargs):
+        with use_primary():
+            return super().dispatch(request, *args, **kwargs)
@@ -1,3 +1,781 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
+import json
+from pathlib import Path
+import smtplib
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
 
-# Create your tests here.
+import rsa
+from google.auth import crypt, jwt as google_jwt
+
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, connections, transaction
+from django.db.models.functions import TruncDate
+from django.core import mail
+from django.core.management import call_command
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from django.contrib.auth import get_user_model
+from .archive import archive_messages, message_history
+from . import providers
+from .dashboard import daily_activity
+from .breakers import CircuitBreaker, CircuitOpenError, get_breaker
+from .models import ArchivedUserMessage, AuthProvider, OTPCode, UserMessageContents
+from .routers import PrimaryReplicaRouter, reset_routing_state, use_primary
+from .utils import generate_access_token
+
+
+User = get_user_model()
+
+
+@mock.patch('portfolio_v2.routers.get_replicas', return_value=['replica'])
+class PrimaryReplicaRouterTests(SimpleTestCase):
+    def setUp(self):
+        reset_routing_state()
+        self.addCleanup(reset_routing_state)
+        self.router = PrimaryReplicaRouter()
+
+    def test_reads_go_to_replica(self, _replicas):
+        self.assertEqual(self.router.db_for_read(User), 'replica')
+
+    def test_writes_go_to_primary_and_make_reads_sticky(self, _replicas):
+        self.assertEqual(self.router.db_for_write(User), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    def test_use_primary_pins_reads(self, _replicas):
+        with use_primary():
+            self.assertEqual(self.router.db_for_read(User), DEFAULT_DB_ALIAS)
+        self.assertEqual(self.router.db_for_read(User), 'replica')
+
+    def test_migrations_skip_replicas(self, _replicas):
+        self.assertFalse(self.router.allow_migrate('replica', 'portfolio_v2'))
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'portfolio_v2'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaQueryRoutingTests(TransactionTestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # Unless DATABASE_REPLICAS=replica already configured one, add a
+        # 'replica' alias as a second connection to the primary's test database.
+        if 'replica' not in connections:
+            connections.settings['replica'] = {
+                **connections[DEFAULT_DB_ALIAS].settings_dict,
+                'TEST': {'MIRROR': DEFAULT_DB_ALIAS},
+            }
+            cls.addClassCleanup(cls._remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def _remove_replica(cls):
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        reset_routing_state()
+        self.addCleanup(reset_routing_state)
+
+    def social_login(self, email):
+        verifier = mock.Mock()
+        verifier.verify.return_value = providers.ProviderIdentity(email=email)
+        with mock.patch('portfolio_v2.views.get_verifier', return_value=verifier):
+            response = self.client.post(
+                reverse('social_verification'),
+                {'provider': 'github', 'access_token': 'token'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 200)
+        return response.json()['access_token']
+
+    def list_messages(self, token):
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse('user_messages'), headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        return len(replica)
+
+    def test_reads_inside_transaction_stay_on_primary(self):
+        with CaptureQueriesContext(connections['replica']) as replica, transaction.atomic():
+            list(User.objects.all())
+        self.assertEqual(len(replica), 0)
+
+    def test_plain_read_hits_replica(self):
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary:
+            list(User.objects.all())
+        self.assertEqual(len(replica), 1)
+        self.assertEqual(len(primary), 0)
+
+    def test_signup_never_reads_from_replica(self):
+        with CaptureQueriesContext(connections['replica']) as replica, \
+                mock.patch('portfolio_v2.views._send_otp_email'):
+            response = self.client.post(
+                reverse('signup_user'),
+                {'provider': 'manual', 'email': 'router@example.com'},
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(len(replica), 0)
+        self.assertEqual(OTPCode.objects.using(DEFAULT_DB_ALIAS).count(), 1)
+
+    def test_request_after_signup_reads_from_primary(self):
+        token = self.social_login('new@example.com')
+
+        # JWTAuthentication looks the new user up on the primary, not on a
+        # replica that may not have the row yet.
+        self.assertEqual(self.list_messages(token), 0)
+
+    def test_other_clients_keep_reading_from_replica(self):
+        other = User.objects.create_user(email='other@example.com')
+        self.social_login('new@example.com')
+
+        self.assertGreater(self.list_messages(generate_access_token(other)), 0)
+
+    def test_page_after_admin_login_reads_from_primary(self):
+        User.objects.create_superuser(email='admin@example.com', password='secret')
+        self.client.post(reverse('admin:login'), {'username': 'admin@example.com', 'password': 'secret'})
+
+        with CaptureQueriesContext(connections['replica']) as replica:
+            response = self.client.get(reverse('admin:index'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(replica), 0)
+
+
+@override_settings(DATABASE_REPLICAS=['replica_file'])
+class SQLiteReplicaSyncTests(TransactionTestCase):
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        # A separate SQLite file, like the local default for DATABASE_REPLICAS.
+        tmpdir = tempfile.TemporaryDirectory()
+        cls.addClassCleanup(tmpdir.cleanup)
+        connections.settings['replica_file'] = {
+            **connections[DEFAULT_DB_ALIAS].settings_dict,
+            'NAME': str(Path(tmpdir.name) / 'replica.sqlite3'),
+            'TEST': {'MIRROR': None},
+        }
+        cls.addClassCleanup(cls._remove_replica)
+        super().setUpClass()
+
+    @classmethod
+    def _remove_replica(cls):
+        connections['replica_file'].close()
+        del connections['replica_file']
+        del connections.settings['replica_file']
+
+    def setUp(self):
+        reset_routing_state()
+        self.addCleanup(reset_routing_state)
+
+    def test_sync_copies_schema_and_rows_into_replica_file(self):
+        User.objects.create_user(email='synced@example.com')
+        reset_routing_state()
+        with self.assertRaisesMessage(Exception, 'no such table'):
+            User.objects.count()
+
+        call_command('sync_replicas', stdout=StringIO())
+        User.objects.create_user(email='later@example.com')
+        reset_routing_state()
+
+        # Reads hit the replica file, which has what the primary had at sync time.
+        self.assertEqual(list(User.objects.values_list('email', flat=True)), ['synced@example.com'])
+        self.assertEqual(User.objects.using(DEFAULT_DB_ALIAS).count(), 2)
+
+
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def signup(self, key, email='retry@example.com'):
+        return self.client.post(
+            reverse('signup_user'),
+            {'provider': 'manual', 'email': email},
+            content_type='application/json',
+            headers={'Idempotency-Key': key},
+        )
+
+    def test_retried_signup_sends_one_otp(self):
+        first = self.signup('abc')
+        second = self.signup('abc')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(OTPCode.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_response_stored_just_before_lock_is_replayed(self):
+        self.signup('abc')
+        real_get = cache.get
+        lookups = []
+
+        def get(key, *args, **kwargs):
+            # The retry's first lookup misses, as if it ran just before the
+            # first request stored its response.
+            lookups.append(key)
+            return None if len(lookups) == 1 else real_get(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'get', side_effect=get):
+            response = self.signup('abc')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertEqual(OTPCode.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_new_key_runs_again(self):
+        self.signup('abc')
+        self.signup('def')
+        self.assertEqual(OTPCode.objects.count(), 2)
+
+    def test_key_reused_with_different_body_is_rejected(self):
+        self.signup('abc')
+        response = self.signup('abc', email='other@example.com')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_retried_message_is_saved_once(self):
+        user = User.objects.create_user(email='member@example.com', name='Member')
+        token = generate_access_token(user)
+        payload = {'provider': 'manual', 'email': user.email, 'purpose': 'Hire', 'message': 'Hello'}
+
+        for _ in range(2):
+            response = self.client.post(
+                reverse('process_user_message'),
+                payload,
+                content_type='application/json',
+                headers={'Authorization': f'Bearer {token}', 'Idempotency-Key': 'msg-1'},
+            )
+            self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(UserMessageContents.objects.count(), 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+class MessageArchiveTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='old@example.com', name='Old')
+        now = timezone.now()
+        for days, text in [(400, 'oldest'), (200, 'old'), (1, 'recent')]:
+            msg = UserMessageContents.objects.create(user=self.user, purpose='Hire', message=text)
+            UserMessageContents.objects.filter(pk=msg.pk).update(timestamp=now - timedelta(days=days))
+
+    def test_old_messages_move_to_archive_in_batches(self):
+        result = archive_messages(older_than=timedelta(days=30), batch_size=1)
+
+        self.assertEqual(result.rows, 2)
+        self.assertEqual(list(UserMessageContents.objects.values_list('message', flat=True)), ['recent'])
+        self.assertEqual([m.message for m in ArchivedUserMessage.objects.all()], ['oldest', 'old'])
+
+    def test_conflicting_archive_row_keeps_hot_message(self):
+        oldest = UserMessageContents.objects.get(message='oldest')
+        ArchivedUserMessage.objects.create(original_id=oldest.pk, timestamp=oldest.timestamp)
+
+        with self.assertRaises(IntegrityError):
+            archive_messages(older_than=timedelta(days=30))
+
+        self.assertEqual(UserMessageContents.objects.count(), 3)
+        self.assertEqual(ArchivedUserMessage.objects.count(), 1)
+
+    def test_history_merges_hot_and_archived_messages(self):
+        archive_messages(older_than=timedelta(days=30))
+
+        history = message_history(user=self.user)
+        self.assertEqual([m['message'] for m in history], ['oldest', 'old', 'recent'])
+        self.assertEqual([m['archived'] for m in history], [True, True, False])
+
+    def test_messages_endpoint_includes_archived_messages(self):
+        archive_messages(older_than=timedelta(days=30))
+        other = User.objects.create_user(email='other@example.com')
+        UserMessageContents.objects.create(user=other, message='not mine')
+
+        response = self.client.get(
+            reverse('user_messages'),
+            headers={'Authorization': f'Bearer {generate_access_token(self.user)}'},
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([m['message'] for m in response.json()['messages']], ['oldest', 'old', 'recent'])
+        self.assertEqual([m['archived'] for m in response.json()['messages']], [True, True, False])
+
+    def test_command_reports_throughput(self):
+        out = StringIO()
+        call_command('archive_messages', days=300, stdout=out)
+        self.assertIn('Archived 1 messages', out.getvalue())
+        self.assertIn('rows/sec', out.getvalue())
+
+
+def _signing_key(key_id):
+    public, private = rsa.newkeys(1024)
+    signer = crypt.RSASigner.from_string(private.save_pkcs1(), key_id=key_id)
+    return signer, public.save_pkcs1().decode()
+
+
+def _google_id_token(signer, **claims):
+    now = int(time.time())
+    payload = {
+        'iss': 'https://accounts.google.com',
+        'aud': 'client-id',
+        'iat': now,
+        'exp': now + 300,
+        'email': 'google@example.com',
+        'email_verified': True,
+        'name': 'Google User',
+        **claims,
+    }
+    return google_jwt.encode(signer, payload).decode()
+
+
+def _certs_response(certs, max_age=3600):
+    response = mock.Mock(headers={'Cache-Control': f'public, max-age={max_age}'})
+    response.json.return_value = certs
+    return response
+
+
+class GoogleIDTokenVerifierTests(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.signer, cls.public_key = _signing_key('key-1')
+        cls.rotated_signer, cls.rotated_public_key = _signing_key('key-2')
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.certs = providers.CachedCerts(
+            'https://certs.example.com', CircuitBreaker('test-certs'), min_refresh_interval=0
+        )
+        self.verifier = providers.GoogleIDTokenVerifier(audience=['client-id'], certs=self.certs)
+        patcher = mock.patch('portfolio_v2.providers.requests.get')
+        self.get = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.get.return_value = _certs_response({'key-1': self.public_key})
+
+    def test_valid_token_is_verified_locally_after_first_fetch(self):
+        for _ in range(3):
+            identity = self.verifier.verify(_google_id_token(self.signer))
+        self.assertEqual(identity, providers.ProviderIdentity(email='google@example.com', name='Google User'))
+        self.assertEqual(self.get.call_count, 1)
+
+    def test_wrong_audience_is_rejected(self):
+        with self.assertRaises(providers.ProviderVerificationError):
+            self.verifier.verify(_google_id_token(self.signer, aud='someone-else'))
+
+    def test_wrong_issuer_is_rejected(self):
+        with self.assertRaises(providers.ProviderVerificationError):
+            self.verifier.verify(_google_id_token(self.signer, iss='https://evil.example.com'))
+
+    def test_token_signed_by_unknown_key_is_rejected(self):
+        forged_signer = crypt.RSASigner.from_string(
+            rsa.newkeys(1024)[1].save_pkcs1(), key_id='key-1'
+        )
+        with self.assertRaises(providers.ProviderVerificationError):
+            self.verifier.verify(_google_id_token(forged_signer))
+
+    def test_rotated_key_triggers_refetch(self):
+        self.verifier.verify(_google_id_token(self.signer))
+        self.get.return_value = _certs_response({'key-2': self.rotated_public_key})
+
+        identity = self.verifier.verify(_google_id_token(self.rotated_signer))
+
+        self.assertEqual(identity.email, 'google@example.com')
+        self.assertEqual(self.get.call_count, 2)
+
+    def test_failed_refetch_keeps_cached_certs_and_backs_off(self):
+        certs = providers.CachedCerts('https://certs.example.com', CircuitBreaker('test-certs'))
+        self.get.return_value = _certs_response({'key-1': self.public_key}, max_age=0)
+        certs.get('key-1')
+        self.get.side_effect = providers.requests.ConnectionError
+
+        for _ in range(3):
+            self.assertEqual(certs.get('key-1'), {'key-1': self.public_key})
+
+        self.assertEqual(self.get.call_count, 2)
+
+
+@override_settings(GOOGLE_CLIENT_IDS=['client-id'])
+class SocialAuthIDTokenTests(TestCase):
+    def setUp(self):
+        providers._id_token_verifiers.clear()
+        self.addCleanup(providers._id_token_verifiers.clear)
+
+    def test_google_id_token_login_without_userinfo_call(self):
+        signer, public_key = _signing_key('key-1')
+        with mock.patch('portfolio_v2.providers.requests.get',
+                        return_value=_certs_response({'key-1': public_key})) as get:
+            for _ in range(2):
+                response = self.client.post(
+                    reverse('social_verification'),
+                    {'provider': 'google', 'id_token': _google_id_token(signer)},
+                    content_type='application/json',
+                )
+                self.assertEqual(response.status_code, 200)
+
+        get.assert_called_once_with(providers.GoogleIDTokenVerifier.certs_url, timeout=mock.ANY)
+        self.assertTrue(User.objects.get(email='google@example.com').auth_providers.filter(provider='google').exists())
+
+
+def _fake_json(payloads, barrier=None, status=200):
+    def get(url, **kwargs):
+        if barrier is not None:
+            barrier.wait()
+        response = providers.requests.Response()
+        response.status_code = status
+        response.url = url
+        response._content = json.dumps(payloads[url]).encode()
+        return response
+    return get
+
+
+class ProviderFanOutTests(SimpleTestCase):
+    def test_lookups_run_concurrently(self):
+        # Each lookup only returns once all three are running at the same time.
+        barrier = threading.Barrier(3, timeout=5)
+        calls = {name: barrier.wait for name in ('profile', 'emails', 'avatar')}
+
+        results = providers.fan_out(calls, deadline=10)
+
+        self.assertEqual(sorted(results), ['avatar', 'emails', 'profile'])
+        for result in results.values():
+            self.assertNotIsInstance(result, Exception)
+
+    def test_deadline_bounds_total_wait(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        results = providers.fan_out({'fast': lambda: 'ok', 'stuck': release.wait}, deadline=0.1)
+
+        self.assertEqual(results['fast'], 'ok')
+        self.assertIsInstance(results['stuck'], TimeoutError)
+
+    def busy_executor(self):
+        """A one-worker pool whose worker is held until the test ends."""
+        executor = ThreadPoolExecutor(max_workers=1)
+        self.addCleanup(executor.shutdown)
+        release = threading.Event()
+        self.addCleanup(release.set)
+        executor.submit(release.wait)
+        return mock.patch.object(providers, '_executor', executor)
+
+    def test_deadline_includes_time_queued_for_a_worker(self):
+        with self.busy_executor():
+            results = providers.fan_out({'profile': lambda: 'ok', 'emails': lambda: 'ok'}, deadline=0.1)
+
+        self.assertIsInstance(results['profile'], providers.LookupNotStartedError)
+        self.assertIsInstance(results['emails'], providers.LookupNotStartedError)
+
+    @override_settings(SOCIAL_AUTH_DEADLINE=0.1)
+    def test_lookups_stuck_in_queue_leave_provider_breaker_closed(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+        with self.busy_executor(), mock.patch('portfolio_v2.providers.requests.get') as get:
+            with self.assertRaises(providers.ProviderUnavailableError):
+                providers.GitHubVerifier().verify('token')
+
+        get.assert_not_called()
+        self.assertEqual(get_breaker('provider:github').snapshot()['failures'], 0)
+
+    def test_github_hidden_email_lookups_run_concurrently(self):
+        payloads = {
+            'https://api.github.com/user': {'id': 1, 'email': None, 'name': 'Octo'},
+            'https://api.github.com/user/emails': [
+                {'email': 'old@example.com', 'primary': False, 'verified': True},
+                {'email': 'octo@example.com', 'primary': True, 'verified': True},
+            ],
+        }
+        barrier = threading.Barrier(2, timeout=5)
+        with mock.patch('portfolio_v2.providers.requests.get', side_effect=_fake_json(payloads, barrier)):
+            identity = providers.GitHubVerifier().verify('token')
+
+        self.assertEqual(identity, providers.ProviderIdentity(email='octo@example.com', name='Octo'))
+
+    def test_github_invalid_token(self):
+        payloads = {
+            'https://api.github.com/user': {'message': 'Bad credentials'},
+            'https://api.github.com/user/emails': {'message': 'Bad credentials'},
+        }
+        with mock.patch('portfolio_v2.providers.requests.get', side_effect=_fake_json(payloads)):
+            with self.assertRaisesMessage(providers.ProviderVerificationError, 'Invalid GitHub token'):
+                providers.GitHubVerifier().verify('token')
+
+
+@override_settings(CIRCUIT_BREAKER_FAILURE_THRESHOLD=2, CIRCUIT_BREAKER_RESET_TIMEOUT=30)
+class CircuitBreakerTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.breaker = CircuitBreaker('test')
+        self.failing = mock.Mock(side_effect=OSError('down'))
+
+    def trip(self):
+        for _ in range(2):
+            with self.assertRaises(OSError):
+                self.breaker.call(self.failing)
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        self.trip()
+
+        self.assertEqual(self.breaker.state(), CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError) as ctx:
+            self.breaker.call(self.failing)
+        self.assertEqual(self.failing.call_count, 2)
+        self.assertLessEqual(ctx.exception.retry_after, 30)
+
+    def test_excluded_errors_do_not_count(self):
+        for _ in range(3):
+            with self.assertRaises(ValueError):
+                self.breaker.call(mock.Mock(side_effect=ValueError), is_failure=lambda e: isinstance(e, OSError))
+
+        self.assertEqual(self.breaker.state(), CircuitBreaker.CLOSED)
+
+    def test_success_resets_failure_count(self):
+        with self.assertRaises(OSError):
+            self.breaker.call(self.failing)
+        self.breaker.call(lambda: None)
+        with self.assertRaises(OSError):
+            self.breaker.call(self.failing)
+
+        self.assertEqual(self.breaker.state(), CircuitBreaker.CLOSED)
+
+    def test_half_open_lets_one_probe_through(self):
+        self.trip()
+        with mock.patch('portfolio_v2.breakers.time.time', return_value=time.time() + 31):
+            self.assertEqual(self.breaker.state(), CircuitBreaker.HALF_OPEN)
+            self.breaker.allow()
+            with self.assertRaises(CircuitOpenError):
+                self.breaker.allow()
+
+            self.breaker.record_success()
+        self.assertEqual(self.breaker.state(), CircuitBreaker.CLOSED)
+
+    def test_failed_probe_reopens(self):
+        self.trip()
+        with mock.patch('portfolio_v2.breakers.time.time', return_value=time.time() + 31):
+            with self.assertRaises(OSError):
+                self.breaker.call(self.failing)
+            self.assertEqual(self.breaker.state(), CircuitBreaker.OPEN)
+
+
+@override_settings(CIRCUIT_BREAKER_FAILURE_THRESHOLD=1)
+class DependencyDegradationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def trip_smtp(self):
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=smtplib.SMTPException):
+            self.client.post(
+                reverse('signup_user'),
+                {'provider': 'manual', 'email': 'first@example.com'},
+                content_type='application/json',
+            )
+        self.assertEqual(get_breaker('smtp').state(), CircuitBreaker.OPEN)
+
+    def test_refused_recipients_leave_smtp_breaker_closed(self):
+        refused = smtplib.SMTPRecipientsRefused({'bogus@invalid': (550, b'No such user')})
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send', side_effect=refused):
+            for i in range(3):
+                self.client.post(
+                    reverse('signup_user'),
+                    {'provider': 'manual', 'email': f'bogus{i}@invalid'},
+                    content_type='application/json',
+                )
+
+        self.assertEqual(get_breaker('smtp').state(), CircuitBreaker.CLOSED)
+
+    def test_signup_fails_fast_while_smtp_is_down(self):
+        self.trip_smtp()
+
+        with mock.patch('django.core.mail.EmailMultiAlternatives.send') as send:
+            response = self.client.post(
+                reverse('signup_user'),
+                {'provider': 'manual', 'email': 'second@example.com'},
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('Retry-After', response)
+        send.assert_not_called()
+        self.assertFalse(User.objects.filter(email='second@example.com').exists())
+
+    def test_message_is_saved_while_smtp_is_down(self):
+        self.trip_smtp()
+        user = User.objects.create_user(email='member@example.com')
+
+        with self.assertLogs('portfolio_v2.utils', 'WARNING'):
+            response = self.client.post(
+                reverse('process_user_message'),
+                {'provider': 'manual', 'email': user.email, 'purpose': 'Hire', 'message': 'Hello'},
+                content_type='application/json',
+                headers={'Authorization': f'Bearer {generate_access_token(user)}'},
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(UserMessageContents.objects.filter(user=user).count(), 1)
+
+    def test_social_login_fails_fast_while_provider_is_down(self):
+        with mock.patch('portfolio_v2.providers.requests.get', side_effect=providers.requests.ConnectionError) as get:
+            for expected in (503, 503):
+                response = self.client.post(
+                    reverse('social_verification'),
+                    {'provider': 'facebook', 'access_token': 'token'},
+                    content_type='application/json',
+                )
+                self.assertEqual(response.status_code, expected)
+
+        self.assertEqual(get.call_count, 1)
+
+    def test_provider_server_errors_count_against_its_breaker(self):
+        userinfo = 'https://www.googleapis.com/oauth2/v3/userinfo'
+        for status, expected, state in ((503, 503, 'open'), (429, 503, 'open'), (401, 401, 'closed')):
+            with self.subTest(status=status):
+                cache.clear()
+                fake = _fake_json({userinfo: {'error': 'backend_error'}}, status=status)
+                with mock.patch('portfolio_v2.providers.requests.get', side_effect=fake):
+                    response = self.client.post(
+                        reverse('social_verification'),
+                        {'provider': 'google', 'access_token': 'token'},
+                        content_type='application/json',
+                    )
+
+                self.assertEqual(response.status_code, expected)
+                self.assertEqual(get_breaker('provider:google').state(), state)
+
+    def test_failed_optional_lookup_leaves_provider_breaker_closed(self):
+        def get(url, **kwargs):
+            if url.endswith('/emails'):
+                raise providers.requests.ConnectionError
+            return _fake_json({url: {'id': 1, 'email': 'octo@example.com'}})(url)
+
+        with mock.patch('portfolio_v2.providers.requests.get', side_effect=get):
+            response = self.client.post(
+                reverse('social_verification'),
+                {'provider': 'github', 'access_token': 'token'},
+                content_type='application/json',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_breaker('provider:github').state(), CircuitBreaker.CLOSED)
+
+    def test_metrics_report_breaker_state(self):
+        self.trip_smtp()
+        admin = User.objects.create_superuser(email='admin@example.com', password='secret')
+        self.client.force_login(admin)
+
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['circuit_breakers']['smtp']['state'], 'open')
+        self.assertIn('provider:github', response.json()['circuit_breakers'])
+
+
+class AdminTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(email='admin@example.com', password='secret')
+        self.client.force_login(self.admin)
+
+    def add_users(self, count, provider='manual'):
+        for i in range(count):
+            user = User.objects.create_user(email=f'{provider}{i}-{User.objects.count()}@example.com')
+            user.auth_providers.create(provider=provider)
+            OTPCode.objects.create(user=user, otp_code='123456')
+            message = UserMessageContents.objects.create(user=user, purpose='Hire', message='Hello')
+            ArchivedUserMessage.objects.create(original_id=-message.pk, user=user, timestamp=message.timestamp)
+
+    def changelist_queries(self, model):
+        url = reverse(f'admin:portfolio_v2_{model}_changelist')
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        return len(queries)
+
+    def test_changelists_run_constant_queries(self):
+        for model in ('customuser', 'authprovider', 'otpcode', 'usermessagecontents', 'archivedusermessage'):
+            with self.subTest(model=model):
+                self.add_users(1)
+                few = self.changelist_queries(model)
+                self.add_users(5)
+                self.assertEqual(self.changelist_queries(model), few)
+
+    def test_archive_action(self):
+        self.add_users(3)
+        selected = list(UserMessageContents.objects.values_list('pk', flat=True)[:2])
+
+        self.client.post(
+            reverse('admin:portfolio_v2_usermessagecontents_changelist'),
+            {'action': 'archive_selected', '_selected_action': selected},
+        )
+
+        self.assertEqual(UserMessageContents.objects.count(), 1)
+        self.assertEqual(ArchivedUserMessage.objects.filter(original_id__in=selected).count(), 2)
+
+    def test_daily_activity_counts_per_provider(self):
+        self.add_users(2, provider='github')
+        self.add_users(1, provider='google')
+        User.objects.filter(auth_providers__provider='google').update(is_verified=False, verified_at=None)
+        today = AuthProvider.objects.annotate(day=TruncDate('created')).values_list('day', flat=True).first()
+
+        with self.assertNumQueries(4):
+            rows = daily_activity(days=7)
+
+        # add_users() gives every user one hot and one archived message.
+        self.assertEqual(rows, [
+            {'day': today, 'provider': 'google', 'signups': 1, 'verifications': 0, 'messages': 2},
+            {'day': today, 'provider': 'github', 'signups': 2, 'verifications': 2, 'messages': 4},
+        ])
+
+    def test_daily_activity_counts_archived_messages(self):
+        user = User.objects.create_user(email='old@example.com')
+        user.auth_providers.create(provider='google')
+        message = UserMessageContents.objects.create(user=user, message='Hello')
+        old_timestamp = timezone.now() - timedelta(days=200)
+        UserMessageContents.objects.filter(pk=message.pk).update(timestamp=old_timestamp)
+        archive_messages(older_than=timedelta(days=180))
+
+        rows = daily_activity(days=365)
+
+        old_day = [row for row in rows if row['day'] == old_timestamp.date()]
+        self.assertEqual(old_day, [
+            {'day': old_timestamp.date(), 'provider': 'google', 'signups': 0, 'verifications': 0, 'messages': 1},
+        ])
+
+    def test_daily_activity_counts_verifications_on_the_day_they_happen(self):
+        user = User.objects.create(email='late@example.com', is_verified=False, is_active=False)
+        user.auth_providers.create(provider='manual')
+        signup_day = timezone.now() - timedelta(days=3)
+        AuthProvider.objects.filter(user=user).update(created=signup_day)
+        OTPCode.objects.create(user=user, otp_code='123456')
+
+        response = self.client.post(
+            reverse('otp_verification'),
+            {'provider': 'manual', 'email': user.email, 'otp_code': '123456', 'message': 'Hi'},
+            content_type='application/json',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        user.refresh_from_db()
+        rows = [row for row in daily_activity(days=7) if row['provider'] == 'manual']
+        self.assertEqual(rows, [
+            {'day': user.verified_at.date(), 'provider': 'manual', 'signups': 0, 'verifications': 1, 'messages': 1},
+            {'day': signup_day.date(), 'provider': 'manual', 'signups': 1, 'verifications': 0, 'messages': 0},
+        ])
+
+    def test_dashboard_page(self):
+        self.add_users(2, provider='github')
+        response = self.client.get(reverse('admin:portfolio_v2_dashboard'), {'days': 7})
+        self.assertContains(response, 'github')
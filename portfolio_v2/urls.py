@@ -1,10 +1,12 @@
 
 from django.urls import path
-from .views import ManualSignupView, OTPVerificationView, ProcessUserMessageView, SocialAuthView
+from .views import ManualSignupView, OTPVerificationView, ProcessUserMessageView, SocialAuthView, UserMessageHistoryView, MetricsView
 
 urlpatterns = [
     path('signup/', ManualSignupView.as_view(), name='signup_user'),
     path('otp-verification/', OTPVerificationView.as_view(), name='otp_verification'),
     path('social-verification/', SocialAuthView.as_view(), name='social_verification'),
     path('process-message/', ProcessUserMessageView.as_view(), name='process_user_message'),
+    path('messages/', UserMessageHistoryView.as_view(), name='user_messages'),
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
\ No newline at end of file
@@ -1,9 +1,32 @@
+import logging
+from smtplib import (
+    SMTPConnectError, SMTPException, SMTPRecipientsRefused, SMTPResponseException,
+    SMTPSenderRefused, SMTPServerDisconnected,
+)
+
 from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
 from rest_framework_simplejwt.exceptions import TokenError, InvalidToken
 
 from django.core.mail import EmailMultiAlternatives
 from django.conf import settings
 
+from .breakers import CircuitOpenError, get_breaker
+
+
+logger = logging.getLogger(__name__)
+
+# Every outgoing email goes through this breaker, so a Gmail outage fails fast.
+smtp_breaker = get_breaker("smtp")
+
+
+# Only connection problems and server errors mean SMTP is down; a refused
+# address is the client's fault and must not open the breaker for everyone.
+def _is_smtp_outage(error):
+    if isinstance(error, (SMTPRecipientsRefused, SMTPSenderRefused)):
+        return False
+    return isinstance(error, (SMTPServerDisconnected, SMTPConnectError, SMTPResponseException, OSError))
+
+
 # Send OTP email
 def _send_otp_email(user, otp_code):
     subject = "OTP code for user verification"
@@ -26,7 +49,7 @@ def _send_otp_email(user, otp_code):
         # bcc=[settings.EMAIL_HOST_USER]  # hidden copy to myself
     )
     msg.attach_alternative(html_content, "text/html")
-    msg.send()
+    smtp_breaker.call(msg.send, is_failure=_is_smtp_outage)
 
 
 # Get client message email
@@ -73,7 +96,18 @@ def _get_email_client(email, name, purpose, message):
         [to],
     )
     msg.attach_alternative(html_content, "text/html")
-    msg.send()
+    smtp_breaker.call(msg.send, is_failure=_is_smtp_outage)
+
+
+# Forward a client message without failing the request when email is down;
+# the message is already saved and can be read in the admin.
+def _notify_client_message(email, name, purpose, message):
+    try:
+        _get_email_client(email, name, purpose, message)
+        return True
+    except (CircuitOpenError, SMTPException, OSError) as e:
+        logger.warning("Client message from %s was saved but not emailed: %s", email, e)
+        return False
 
 
 
@@ -1,26 +1,42 @@
-import requests
 import random
 from django.db import transaction, IntegrityError
+from django.utils import timezone
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 
 from django.contrib.auth import get_user_model
 from .models import UserMessageContents, OTPCode
-from .utils import _send_otp_email, _get_email_client, generate_access_token
+from .routers import PrimaryDatabaseMixin, mark_writer
+from .idempotency import idempotent
+from .archive import message_history
+from .breakers import CircuitOpenError, breaker_snapshots
+from .providers import ProviderUnavailableError, ProviderVerificationError, get_verifier
+from .utils import _send_otp_email, _notify_client_message, generate_access_token
 
 
 User = get_user_model()
 
 
-class ManualSignupView(APIView):
+# 503 for an external dependency that is down or whose breaker is open
+def _service_unavailable(error):
+    response = Response({"error": str(error)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after:
+        response["Retry-After"] = str(retry_after)
+    return response
+
+
+class ManualSignupView(PrimaryDatabaseMixin, APIView):
     authentication_classes = []  # no auth needed for signup
     permission_classes = []      # open endpoint
 
+    @idempotent
     def post(self, request):
         data = request.data  
 
@@ -71,6 +87,8 @@ class ManualSignupView(APIView):
                     "active": False
                 }, status=status.HTTP_201_CREATED)
 
+        except CircuitOpenError as e:
+            return _service_unavailable(e)
         except IntegrityError as e:
             return Response({"error": f"Database error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
@@ -78,7 +96,7 @@ class ManualSignupView(APIView):
 
 
 
-class OTPVerificationView(APIView):
+class OTPVerificationView(PrimaryDatabaseMixin, APIView):
     authentication_classes = []
     permission_classes = []
 
@@ -118,9 +136,12 @@ class OTPVerificationView(APIView):
                     return Response({"error": "OTP expired"}, status=status.HTTP_400_BAD_REQUEST)
 
                 # ✅ Mark user verified and active
+                if not user.is_verified:
+                    user.verified_at = timezone.now()
                 user.is_verified = True
                 user.is_active = True
-                user.save(update_fields=["is_verified", "is_active"])
+                user.save(update_fields=["is_verified", "is_active", "verified_at"])
+                mark_writer(user)
 
                 # ❌ Delete all OTPs after success
                 OTPCode.objects.filter(user=user).delete()
@@ -132,7 +153,7 @@ class OTPVerificationView(APIView):
                         message=message
                     )
 
-                    _get_email_client(email, name, purpose, message)
+                    _notify_client_message(email, name, purpose, message)
 
                     access_token = generate_access_token(user)
                     return Response({
@@ -149,91 +170,41 @@ class OTPVerificationView(APIView):
         
 
 
-class SocialAuthView(APIView):
+class SocialAuthView(PrimaryDatabaseMixin, APIView):
     authentication_classes = []
     permission_classes = []
 
     def post(self, request):
         provider = request.data.get("provider")
         token = request.data.get("access_token")
+        id_token = request.data.get("id_token")
         provider_details = request.data.get("provider_details")
 
-        if not provider or not token:
+        if not provider or not (token or id_token):
             return Response(
-                {"error": "Provider and access_token are required"},
+                {"error": "Provider and access_token or id_token are required"},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        email, name = None, None
+        # An ID token is checked locally against cached provider keys;
+        # an access token costs a call to the provider's userinfo API.
+        verifier = get_verifier(provider, id_token=not token)
+        if verifier is None:
+            return Response(
+                {"error": "Unsupported provider"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
         try:
-            if provider == "google":
-                # ✅ Google UserInfo endpoint
-                resp = requests.get(
-                    "https://www.googleapis.com/oauth2/v3/userinfo",
-                    headers={"Authorization": f"Bearer {token}"},
-                )
-                data = resp.json()
-                if "error" in data or "email" not in data:
-                    return Response(
-                        {"error": "Invalid Google token"},
-                        status=status.HTTP_401_UNAUTHORIZED,
-                    )
-                email = data.get("email")
-                name = data.get("name")
+            identity = verifier.verify(token or id_token)
+            email = identity.email
 
-            elif provider == "facebook":
-                # ✅ Facebook Graph API
-                resp = requests.get(
-                    f"https://graph.facebook.com/me?fields=id,name,email&access_token={token}"
-                )
-                data = resp.json()
-                if "error" in data:
-                    return Response(
-                        {"error": "Invalid Facebook token"},
-                        status=status.HTTP_401_UNAUTHORIZED,
-                    )
-                email = data.get("email")
-                name = data.get("name")
-
-            elif provider == "github":
-                # ✅ GitHub API
-                resp = requests.get(
-                    "https://api.github.com/user",
-                    headers={"Authorization": f"Bearer {token}"},
-                )
-                data = resp.json()
-                
-                if "id" not in data:
-                    return Response(
-                        {"error": "Invalid GitHub token"},
-                        status=status.HTTP_401_UNAUTHORIZED,
-                    )
-                email = data.get("email")  # sometimes null if user hides email
-
-                if not email:  # fallback if email is hidden
-                    emails_resp = requests.get(
-                        "https://api.github.com/user/emails",
-                        headers={"Authorization": f"token {token}"},
-                    )
-                    emails_data = emails_resp.json()
-                    for e in emails_data:
-                        if e.get("primary") and e.get("verified"):
-                            email = e["email"]
-                            break
-
-            else:
-                return Response(
-                    {"error": "Unsupported provider"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-            
             try:
                 user, created = User.objects.get_or_create(
                     email=email,
                     is_verified=True,
-                    is_active=True
+                    is_active=True,
+                    defaults={"verified_at": timezone.now()},
                 )
 
                 if created:
@@ -242,7 +213,8 @@ class SocialAuthView(APIView):
                     provider_user, _ = user.auth_providers.get_or_create(provider=provider)
                     provider_user.provider_details = provider_details
                     provider_user.save(update_fields=['provider_details'])
-                
+                mark_writer(user)
+
 
             except IntegrityError as e:
                 return Response({"error": f"Database error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -255,6 +227,10 @@ class SocialAuthView(APIView):
                 "access_token": access_token
             }, status=status.HTTP_200_OK)
 
+        except ProviderVerificationError as e:
+            return Response({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
+        except (CircuitOpenError, ProviderUnavailableError) as e:
+            return _service_unavailable(e)
         except Exception as e:
             return Response({"error": str(e)}, status=status.HTTP_401_UNAUTHORIZED)
 
@@ -264,6 +240,7 @@ class ProcessUserMessageView(APIView):
     authentication_classes = [JWTAuthentication]  # DRF will decode the Bearer token
     permission_classes = [IsAuthenticated]      # Ensures token is required
 
+    @idempotent
     def post(self, request):
         data = request.data  
 
@@ -291,6 +268,8 @@ class ProcessUserMessageView(APIView):
                 if user:
                     user.name = name or user.name
                     user.phone = phone or user.phone
+                    if not user.is_verified:
+                        user.verified_at = timezone.now()
                     user.is_verified = True
                     user.is_active = True
                     user.save()
@@ -307,7 +286,7 @@ class ProcessUserMessageView(APIView):
                             message=message
                         )
 
-                        _get_email_client(email, name, purpose, message)
+                        _notify_client_message(email, name, purpose, message)
 
                         return Response({
                             "message": "Thank you for your message. I will get back to you soon.",
@@ -322,3 +301,34 @@ class ProcessUserMessageView(APIView):
             return Response({"error": f"Database error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         except Exception as e:
             return Response({"error": f"Unexpected error: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+
+class UserMessageHistoryView(APIView):
+    authentication_classes = [JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        # Includes messages the archive job has moved out of the hot table.
+        messages = [
+            {
+                "id": m["id"],
+                "purpose": m["purpose"],
+                "message": m["message"],
+                "timestamp": m["timestamp"],
+                "archived": m["archived"],
+            }
+            for m in message_history(user=request.user)
+        ]
+        return Response({"messages": messages}, status=status.HTTP_200_OK)
+
+
+
+class MetricsView(APIView):
+    authentication_classes = [JWTAuthentication, SessionAuthentication]  # session so it opens from the admin
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({
+            "circuit_breakers": breaker_snapshots(),
+        }, status=status.HTTP_200_OK)
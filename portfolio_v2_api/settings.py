@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 import environ
+from corsheaders.defaults import default_headers
 from pathlib import Path
 from datetime import timedelta
 
@@ -41,6 +42,7 @@ ALLOWED_HOSTS = ['*']
 # CORS settings
 # CORS_ALLOWED_ORIGINS = tuple(env.list('CORS_ALLOWED_ORIGINS', default=[]))
 CORS_ALLOW_ALL_ORIGINS = True
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 # Email configuration
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
@@ -49,6 +51,17 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True
 EMAIL_HOST_USER = env('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = env('EMAIL_HOST_PASSWORD')
+EMAIL_TIMEOUT = env.int('EMAIL_TIMEOUT', default=10)
+
+# Social login
+# OAuth client IDs accepted as the audience of Google ID tokens; leave empty
+# to accept Google access tokens only.
+GOOGLE_CLIENT_IDS = env.list('GOOGLE_CLIENT_IDS', default=[])
+# Seconds to wait on a provider API call
+SOCIAL_AUTH_TIMEOUT = env.float('SOCIAL_AUTH_TIMEOUT', default=5.0)
+# Seconds to wait for all of a provider's concurrent lookups together
+SOCIAL_AUTH_DEADLINE = env.float('SOCIAL_AUTH_DEADLINE', default=6.0)
+SOCIAL_AUTH_MAX_WORKERS = env.int('SOCIAL_AUTH_MAX_WORKERS', default=16)
 
 # REST framework authentication settings
 REST_FRAMEWORK = {
@@ -91,6 +104,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'portfolio_v2.middleware.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -130,6 +144,49 @@ DATABASES = {
     }
 }
 
+# Read replicas, e.g. DATABASE_REPLICAS=replica with REPLICA_DATABASE_URL set.
+# Without a URL a replica defaults to a local SQLite file named after its alias;
+# `manage.py sync_replicas` copies db.sqlite3 into it (run it after migrate).
+DATABASE_REPLICAS = env.list('DATABASE_REPLICAS', default=[])
+for _alias in DATABASE_REPLICAS:
+    DATABASES[_alias] = env.db_url(
+        f'{_alias.upper()}_DATABASE_URL',
+        default=f'sqlite:///{BASE_DIR / _alias}.sqlite3',
+    )
+    # Tests run against the primary's test database.
+    DATABASES[_alias]['TEST'] = {'MIRROR': 'default'}
+
+DATABASE_ROUTERS = ['portfolio_v2.routers.PrimaryReplicaRouter']
+# Seconds a client keeps reading from the primary after it wrote; set above
+# the replicas' usual replication lag.
+REPLICA_STICKY_SECONDS = env.int('REPLICA_STICKY_SECONDS', default=10)
+
+
+# Cache
+# Use a shared backend (e.g. CACHE_URL=redis://...) when running several workers.
+
+CACHES = {
+    'default': env.cache_url('CACHE_URL', default='locmemcache://'),
+}
+
+# Responses stored for repeated Idempotency-Key headers, in seconds
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', default=60 * 60)
+# Cache holding stored responses and in-flight locks; must be shared by all workers
+IDEMPOTENCY_CACHE_ALIAS = env('IDEMPOTENCY_CACHE_ALIAS', default='default')
+# Seconds before the lock of a request that never finished is released
+IDEMPOTENCY_LOCK_TIMEOUT = env.int('IDEMPOTENCY_LOCK_TIMEOUT', default=60)
+
+# Messages older than this are moved to the archive table by `manage.py archive_messages`
+MESSAGE_ARCHIVE_AFTER_DAYS = env.int('MESSAGE_ARCHIVE_AFTER_DAYS', default=180)
+MESSAGE_ARCHIVE_BATCH_SIZE = env.int('MESSAGE_ARCHIVE_BATCH_SIZE', default=500)
+
+# Circuit breakers for SMTP and social providers (state lives in the cache)
+CIRCUIT_BREAKER_FAILURE_THRESHOLD = env.int('CIRCUIT_BREAKER_FAILURE_THRESHOLD', default=5)
+CIRCUIT_BREAKER_FAILURE_WINDOW = env.int('CIRCUIT_BREAKER_FAILURE_WINDOW', default=60)
+CIRCUIT_BREAKER_RESET_TIMEOUT = env.int('CIRCUIT_BREAKER_RESET_TIMEOUT', default=30)
+# Cache holding breaker state; must be shared by all workers
+CIRCUIT_BREAKER_CACHE_ALIAS = env('CIRCUIT_BREAKER_CACHE_ALIAS', default='default')
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators